@@ -3,39 +3,390 @@ Activity Log Application
 A simple application to track daily activities with timestamps.
 """
 
+import atexit
 import json
+import mmap
+import os
+import sys
+import threading
+import time
+import weakref
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _dumps(obj: Any, pretty: bool = False) -> bytes:
+    """Serialize ``obj`` to UTF-8 encoded JSON bytes.
+
+    Output is compact and on a single line unless ``pretty`` is set, in
+    which case it is indented by two spaces.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(buf: Union[bytes, memoryview]) -> Any:
+    """Deserialize JSON from a buffer of UTF-8 encoded bytes."""
+    if orjson is not None:
+        return orjson.loads(buf)
+    if isinstance(buf, memoryview):
+        buf = buf.tobytes()
+    return json.loads(buf)
+
+
+_DEFAULT_FILENAME = "activities.jsonl"
+# Default file of releases before the JSON Lines log; used when the new
+# default file does not exist yet and migrated on the first change.
+_LEGACY_FILENAME = "activities.json"
+
+# Below this size, mmap setup costs more than reading the file outright.
+_MMAP_THRESHOLD = 64 * 1024
+
+# Errors that mark a log record as undecodable. JSONDecodeError (from
+# either parser) is a ValueError; missing or mistyped fields raise the rest.
+_RECORD_ERRORS = (ValueError, KeyError, TypeError)
+
+# Seconds to wait before writing pending log records, so bursts of
+# mutations are coalesced into a single write.
+_FLUSH_DELAY = 0.1
+
+
+# Logs still open at interpreter exit; weak so the set does not keep
+# otherwise unreachable logs alive.
+_open_logs: "weakref.WeakSet[ActivityLog]" = weakref.WeakSet()
 
-class ActivityLog:
-    """Main class for managing activity logs."""
 
-    def __init__(self, filename: str = "activities.json"):
+@atexit.register
+def _close_open_logs() -> None:
+    """Flush and close every log that is still open at exit."""
+    for log in list(_open_logs):
+        log.close()
+
+
+def _iso_to_ns(value: str) -> int:
+    """Convert a legacy ISO 8601 timestamp to nanoseconds since the epoch."""
+    dt = datetime.fromisoformat(value)
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000_000 + dt.microsecond * 1000
+
+
+class ActivityLog:
+    """Main class for managing activity logs.
+
+    Activities are persisted as an append-only JSON Lines log: every
+    mutation appends one ``add``, ``complete`` or ``delete`` record, and
+    loading replays the log from the start. Use :meth:`compact` to
+    rewrite the file with only the surviving activities.
+
+    Records are written in the background shortly after a mutation;
+    call :meth:`flush` (or :meth:`close`) to persist them immediately.
+    """
+
+    # Fixed attribute layout: faster attribute access in the mutation
+    # paths and no per-instance __dict__.
+    __slots__ = (
+        "filename",
+        "_by_id",
+        "_by_category",
+        "_completed_count",
+        "_next_id",
+        "_fp",
+        "_pending",
+        "_timer",
+        "_lock",
+        "_version",
+        "_list_cache",
+        "_list_cache_version",
+        "_needs_rewrite",
+        "_corrupt_path",
+        "__weakref__",
+    )
+
+    def __init__(self, filename: str = _DEFAULT_FILENAME):
         """Initialize the activity log.
 
         Args:
-            filename: Path to the JSON file for storing activities.
+            filename: Path to the JSON Lines file for storing activities.
         """
         self.filename = filename
-        self.activities: List[Dict] = []
+        # Activities keyed by id; dicts keep insertion order, so this is
+        # also the ordered store behind ``activities``.
+        self._by_id: Dict[int, Dict] = {}
+        self._by_category: Dict[str, Dict[int, Dict]] = {}
+        self._completed_count = 0
+        self._next_id = 1
+        # Set when the file on disk cannot simply be appended to (for
+        # example a legacy JSON array); the next flush rewrites it instead.
+        self._needs_rewrite = False
+        # Set when the log file could not be read; it is moved aside
+        # before the first change so its bytes are never overwritten.
+        self._corrupt_path: Optional[str] = None
+        self._fp: Optional[BinaryIO] = None
+        self._pending: List[bytes] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        # Bumped on every change; listings are cached for the current
+        # version only, so stale snapshots are never retained.
+        self._version = 0
+        self._list_cache: Dict[Optional[str], Tuple[Dict, ...]] = {}
+        self._list_cache_version = -1
         self.load_activities()
+        _open_logs.add(self)
+
+    @property
+    def activities(self) -> List[Dict]:
+        """All activities in insertion order."""
+        return list(self._by_id.values())
 
     def load_activities(self) -> None:
-        """Load activities from JSON file."""
+        """Load activities by replaying the log file."""
+        self._clear()
+        source = self.filename
+        if source == _DEFAULT_FILENAME and not os.path.exists(source) and os.path.exists(_LEGACY_FILENAME):
+            source = _LEGACY_FILENAME
+        try:
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size < _MMAP_THRESHOLD:
+                    decoded = self._load_buffer(f.read())
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        decoded = self._load_buffer(mm)
+        except FileNotFoundError:
+            return
+        if source != self.filename:
+            # Write the migrated activities to the new file on the next change.
+            self._needs_rewrite = True
+        if not decoded:
+            print(f"Warning: Could not decode {source}")
+            self._clear()
+            if source == self.filename:
+                self._corrupt_path = source
+
+    def _load_buffer(self, buf: Union[bytes, mmap.mmap]) -> bool:
+        """Replay log records from ``buf`` without copying it.
+
+        Decode errors are handled here rather than propagated: a traceback
+        would keep a slice of ``buf`` alive, and an mmap cannot be closed
+        while one is still exported.
+
+        Returns:
+            True if the buffer was decoded, False otherwise.
+        """
+        with memoryview(buf) as view:
+            if bytes(view[:64]).lstrip().startswith(b"["):
+                return self._load_snapshot(view)
+            return self._replay_lines(buf, view)
+
+    def _load_snapshot(self, view: memoryview) -> bool:
+        """Load a legacy snapshot written as a single JSON array."""
+        try:
+            for activity in _loads(view):
+                self._insert_loaded(activity)
+        except _RECORD_ERRORS:
+            return False
+        self._needs_rewrite = True
+        return True
+
+    def _replay_lines(self, buf: Union[bytes, mmap.mmap], view: memoryview) -> bool:
+        """Replay one log record per line.
+
+        A bad final record is what a crash mid-write leaves behind, so it
+        is skipped with a warning and the file is rewritten on the next
+        change. A bad record followed by further records means the log is
+        corrupt.
+        """
+        torn = False
+        start, end = 0, len(view)
+        while start < end:
+            stop = buf.find(b"\n", start)
+            if stop == -1:
+                stop = end
+            if stop > start:
+                if torn:
+                    return False
+                try:
+                    self._replay(_loads(view[start:stop]))
+                except _RECORD_ERRORS:
+                    torn = True
+            start = stop + 1
+        if torn:
+            print(f"Warning: Skipped incomplete last record in {self.filename}")
+            self._needs_rewrite = True
+        return True
+
+    def _clear(self) -> None:
+        """Drop all in-memory activities and indexes."""
+        self._by_id = {}
+        self._by_category = {}
+        self._completed_count = 0
+        self._next_id = 1
+        self._needs_rewrite = False
+        self._corrupt_path = None
+        self._version += 1
+
+    def _replay(self, record: Dict) -> None:
+        """Apply a single log record to the in-memory activities.
+
+        Raises:
+            ValueError: If the record is not a valid log record.
+        """
+        if not isinstance(record, dict):
+            raise ValueError(f"Log record is not an object: {record!r}")
+        op = record.pop("op", None)
+        if op == "add":
+            self._insert_loaded(record)
+        elif op == "complete":
+            if "completed_at_ns" in record:
+                completed_at_ns = record["completed_at_ns"]
+            else:
+                completed_at_ns = _iso_to_ns(record["completed_at"])
+            self._mark_completed(record["id"], completed_at_ns)
+        elif op == "delete":
+            self._remove(record["id"])
+        else:
+            raise ValueError(f"Unknown log record op: {op!r}")
+
+    def _insert_loaded(self, activity: Dict) -> None:
+        """Fill in keys older logs may lack, intern the category and add the activity."""
+        if not isinstance(activity, dict) or type(activity.get("id")) is not int:
+            # Checked up front: _insert must not index a record it then rejects.
+            raise ValueError(f"Malformed activity: {activity!r}")
+        if activity["id"] in self._by_id:
+            # Logs written before ids came from a counter can repeat an id;
+            # keep both activities and persist the new id on the next change.
+            activity["id"] = self._next_id
+            self._needs_rewrite = True
+        activity["category"] = sys.intern(activity.get("category", "general"))
+        activity.setdefault("completed", False)
+        for key in ("timestamp", "completed_at"):
+            if key in activity:
+                try:
+                    activity[key + "_ns"] = _iso_to_ns(activity[key])
+                except (TypeError, ValueError):
+                    # Keep an unparseable legacy value rather than fail the load.
+                    continue
+                del activity[key]
+        self._insert(activity)
+
+    def _insert(self, activity: Dict) -> None:
+        """Add an activity to memory and index it by id and category."""
+        self._by_id[activity["id"]] = activity
+        self._by_category.setdefault(activity["category"], {})[activity["id"]] = activity
+        if activity["completed"]:
+            self._completed_count += 1
+        self._next_id = max(self._next_id, activity["id"] + 1)
+        self._version += 1
+
+    def _append(self, *records: Dict) -> None:
+        """Queue records for the log file and schedule a flush."""
+        self._write([_dumps(record) + b"\n" for record in records])
+
+    def _write(self, lines: List[bytes]) -> None:
+        """Queue encoded log lines and schedule a flush.
+
+        If the file cannot be appended to, it is rewritten right away on
+        the calling thread instead; the flush timer only ever appends
+        already-encoded lines, so it never reads the live indexes.
+        """
+        with self._lock:
+            if self._corrupt_path is not None:
+                self._set_aside_corrupt()
+            if self._needs_rewrite:
+                # The rewrite already includes the change behind ``lines``.
+                self.save_activities()
+                return
+            self._pending.extend(lines)
+            if self._timer is None:
+                self._timer = threading.Timer(_FLUSH_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _set_aside_corrupt(self) -> None:
+        """Move the unreadable log file aside so a fresh log can start."""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        target = f"{self._corrupt_path}.corrupt"
+        suffix = 1
+        while os.path.exists(target):
+            target = f"{self._corrupt_path}.corrupt.{suffix}"
+            suffix += 1
         try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                self.activities = json.load(f)
+            os.replace(self._corrupt_path, target)
         except FileNotFoundError:
-            self.activities = []
-        except json.JSONDecodeError:
-            print(f"Warning: Could not decode {self.filename}")
-            self.activities = []
+            pass
+        else:
+            print(f"Warning: Moved unreadable {self._corrupt_path} to {target}")
+        self._corrupt_path = None
+
+    def _cancel_flush(self) -> None:
+        """Cancel the scheduled flush, if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self) -> None:
+        """Write all pending log records to the log file."""
+        with self._lock:
+            self._cancel_flush()
+            if not self._pending:
+                return
+            self._log_file().write(b"".join(self._pending))
+            self._pending.clear()
+
+    def _log_file(self) -> BinaryIO:
+        """Return the log file handle, opening it on first use.
+
+        The handle stays open for the lifetime of the log so mutations and
+        compactions do not pay for an open/close each time.
+        """
+        if self._fp is None:
+            self._fp = open(self.filename, "ab", buffering=0)
+        return self._fp
 
     def save_activities(self) -> None:
-        """Save activities to JSON file."""
-        with open(self.filename, "w", encoding="utf-8") as f:
-            json.dump(self.activities, f, indent=2, ensure_ascii=False)
+        """Rewrite the log file with only the surviving activities."""
+        with self._lock:
+            if self._corrupt_path is not None:
+                self._set_aside_corrupt()
+            # Pending records describe changes already in this snapshot.
+            activities = list(self._by_id.values())
+            self._cancel_flush()
+            self._pending.clear()
+            self._needs_rewrite = False
+            fp = self._log_file()
+            fp.seek(0)
+            fp.truncate()
+            fp.write(b"".join(_dumps({"op": "add", **a}) + b"\n" for a in activities))
+
+    def compact(self) -> None:
+        """Compact the log, dropping superseded complete/delete records."""
+        self.save_activities()
+
+    def dump_pretty(self, path: str) -> None:
+        """Write all activities to ``path`` as an indented JSON array.
+
+        Args:
+            path: Destination file for the human-readable dump.
+        """
+        with open(path, "wb") as f:
+            f.write(_dumps(self.activities, pretty=True))
+
+    def close(self) -> None:
+        """Flush the log file to disk and close it."""
+        with self._lock:
+            self.flush()
+            if self._fp is not None:
+                os.fsync(self._fp.fileno())
+                self._fp.close()
+                self._fp = None
 
     def add_activity(self, description: str, category: str = "general") -> Dict:
         """Add a new activity to the log.
@@ -47,29 +398,62 @@ class ActivityLog:
         Returns:
             The created activity dictionary.
         """
+        activity = self._new_activity(description, category, time.time_ns())
+        self._append({"op": "add", **activity})
+        return activity
+
+    def bulk_add(self, items: List[Tuple[str, str]]) -> List[Dict]:
+        """Add several activities sharing one timestamp and one log write.
+
+        Args:
+            items: (description, category) pairs to add.
+
+        Returns:
+            The created activity dictionaries.
+        """
+        timestamp_ns = time.time_ns()
+        activities = [self._new_activity(description, category, timestamp_ns) for description, category in items]
+        if activities:
+            self._append(*({"op": "add", **a} for a in activities))
+        return activities
+
+    def _new_activity(self, description: str, category: str, timestamp_ns: int) -> Dict:
+        """Create an activity with the next id and add it to memory."""
         activity = {
-            "id": len(self.activities) + 1,
+            "id": self._next_id,
             "description": description,
-            "category": category,
-            "timestamp": datetime.now().isoformat(),
+            "category": sys.intern(category),
+            "timestamp_ns": timestamp_ns,
             "completed": False,
         }
-        self.activities.append(activity)
-        self.save_activities()
+        self._insert(activity)
         return activity
 
-    def list_activities(self, category: Optional[str] = None) -> List[Dict]:
+    def list_activities(self, category: Optional[str] = None) -> Tuple[Dict, ...]:
         """List all activities, optionally filtered by category.
 
+        Repeated calls between mutations return the same cached tuple.
+
         Args:
             category: Optional category filter.
 
         Returns:
-            List of activities.
+            Tuple of activities.
         """
+        if self._list_cache_version != self._version:
+            self._list_cache = {}
+            self._list_cache_version = self._version
+        key = category or None
+        listing = self._list_cache.get(key)
+        if listing is None:
+            listing = self._list_cache[key] = self._snapshot(key)
+        return listing
+
+    def _snapshot(self, category: Optional[str]) -> Tuple[Dict, ...]:
+        """Build the current listing for ``category``."""
         if category:
-            return [a for a in self.activities if a.get("category") == category]
-        return self.activities
+            return tuple(self._by_category.get(category, {}).values())
+        return tuple(self._by_id.values())
 
     def complete_activity(self, activity_id: int) -> bool:
         """Mark an activity as completed.
@@ -80,14 +464,24 @@ class ActivityLog:
         Returns:
             True if successful, False otherwise.
         """
-        for activity in self.activities:
-            if activity.get("id") == activity_id:
-                activity["completed"] = True
-                activity["completed_at"] = datetime.now().isoformat()
-                self.save_activities()
-                return True
+        completed_at_ns = time.time_ns()
+        if self._mark_completed(activity_id, completed_at_ns):
+            self._append({"op": "complete", "id": activity_id, "completed_at_ns": completed_at_ns})
+            return True
         return False
 
+    def _mark_completed(self, activity_id: int, completed_at_ns: int) -> bool:
+        """Mark an activity as completed in memory."""
+        activity = self._by_id.get(activity_id)
+        if activity is None:
+            return False
+        if not activity["completed"]:
+            self._completed_count += 1
+        activity["completed"] = True
+        activity["completed_at_ns"] = completed_at_ns
+        self._version += 1
+        return True
+
     def delete_activity(self, activity_id: int) -> bool:
         """Delete an activity from the log.
 
@@ -97,26 +491,41 @@ class ActivityLog:
         Returns:
             True if successful, False otherwise.
         """
-        original_length = len(self.activities)
-        self.activities = [a for a in self.activities if a.get("id") != activity_id]
-        if len(self.activities) < original_length:
-            self.save_activities()
+        if self._remove(activity_id):
+            self._append({"op": "delete", "id": activity_id})
             return True
         return False
 
+    def _remove(self, activity_id: int) -> bool:
+        """Remove an activity from memory."""
+        activity = self._by_id.pop(activity_id, None)
+        if activity is None:
+            return False
+        category = activity["category"]
+        bucket = self._by_category[category]
+        del bucket[activity_id]
+        if not bucket:
+            del self._by_category[category]
+        if activity["completed"]:
+            self._completed_count -= 1
+        self._version += 1
+        return True
+
+    @staticmethod
+    def _fmt(ts_ns: int) -> str:
+        """Render a nanosecond timestamp as a local ISO 8601 string."""
+        seconds, nanos = divmod(ts_ns, 1_000_000_000)
+        return datetime.fromtimestamp(seconds).replace(microsecond=nanos // 1000).isoformat()
+
     def get_statistics(self) -> Dict:
         """Get statistics about activities.
 
         Returns:
             Dictionary with statistics.
         """
-        total = len(self.activities)
-        completed = sum(1 for a in self.activities if a.get("completed"))
-        categories = {}
-
-        for activity in self.activities:
-            cat = activity.get("category", "general")
-            categories[cat] = categories.get(cat, 0) + 1
+        total = len(self._by_id)
+        completed = self._completed_count
+        categories = {cat: len(bucket) for cat, bucket in self._by_category.items()}
 
         return {
             "total": total,
@@ -126,17 +535,20 @@ class ActivityLog:
         }
 
 
+MENU = """=== Activity Log ===
+1. Add activity
+2. List activities
+3. Complete activity
+4. Delete activity
+5. Show statistics
+6. Exit"""
+
+
 def main():
     """Main function for CLI interface."""
     log = ActivityLog()
 
-    print("=== Activity Log ===")
-    print("1. Add activity")
-    print("2. List activities")
-    print("3. Complete activity")
-    print("4. Delete activity")
-    print("5. Show statistics")
-    print("6. Exit")
+    print(MENU)
 
     choice = input("\nEnter choice: ")
 
@@ -147,16 +559,22 @@ def main():
         print(f"Added activity #{activity['id']}")
 
     elif choice == "2":
-        for activity in log.list_activities():
-            status = "✓" if activity.get("completed") else "○"
-            print(f"{status} [{activity['id']}] {activity['description']} ({activity['category']})")
+        lines = [
+            f"{'✓' if a['completed'] else '○'} [{a['id']}] {a['description']} ({a['category']}) "
+            f"{ActivityLog._fmt(a['timestamp_ns']) if 'timestamp_ns' in a else '-'}"
+            for a in log.list_activities()
+        ]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
 
     elif choice == "5":
         stats = log.get_statistics()
-        print(f"\nTotal: {stats['total']}")
-        print(f"Completed: {stats['completed']}")
-        print(f"Pending: {stats['pending']}")
-        print(f"Categories: {stats['categories']}")
+        print(
+            f"\nTotal: {stats['total']}\n"
+            f"Completed: {stats['completed']}\n"
+            f"Pending: {stats['pending']}\n"
+            f"Categories: {stats['categories']}"
+        )
 
 
 if __name__ == "__main__":
@@ -2,8 +2,14 @@
 Unit tests for Activity Log application.
 """
 
+import gc
 import os
 import json
+import time
+import weakref
+from collections import Counter
+from operator import itemgetter
+
 import pytest
 from activity_log import ActivityLog
 
@@ -15,6 +21,7 @@ def temp_log(tmp_path):
     log = ActivityLog(filename=str(test_file))
     yield log
     # Cleanup
+    log.close()
     if test_file.exists():
         test_file.unlink()
 
@@ -35,7 +42,7 @@ class TestActivityLog:
         assert activity["category"] == "development"
         assert activity["id"] == 1
         assert activity["completed"] is False
-        assert "timestamp" in activity
+        assert isinstance(activity["timestamp_ns"], int)
 
     def test_add_multiple_activities(self, temp_log):
         """Test adding multiple activities."""
@@ -47,6 +54,18 @@ class TestActivityLog:
         assert temp_log.activities[0]["id"] == 1
         assert temp_log.activities[2]["id"] == 3
 
+    def test_bulk_add(self, temp_log):
+        """Test adding several activities at once."""
+        activities = temp_log.bulk_add([("Task 1", "work"), ("Task 2", "personal")])
+
+        assert [a["id"] for a in activities] == [1, 2]
+        assert activities[0]["timestamp_ns"] == activities[1]["timestamp_ns"]
+        assert temp_log.activities == activities
+
+        temp_log.flush()
+        reloaded = ActivityLog(filename=temp_log.filename)
+        assert reloaded.activities == activities
+
     def test_list_activities(self, temp_log):
         """Test listing all activities."""
         temp_log.add_activity("Task 1", "work")
@@ -65,6 +84,18 @@ class TestActivityLog:
         assert len(work_activities) == 2
         assert all(a["category"] == "work" for a in work_activities)
 
+    def test_list_activities_cache_invalidated(self, temp_log):
+        """Test that cached listings are refreshed after each mutation."""
+        temp_log.add_activity("Task 1", "work")
+        first = temp_log.list_activities(category="work")
+        assert temp_log.list_activities(category="work") is first
+
+        temp_log.add_activity("Task 2", "work")
+        assert len(temp_log.list_activities(category="work")) == 2
+        assert len(temp_log._list_cache) == 1
+        temp_log.delete_activity(1)
+        assert [a["id"] for a in temp_log.list_activities()] == [2]
+
     def test_complete_activity(self, temp_log):
         """Test marking an activity as completed."""
         activity = temp_log.add_activity("Task to complete", "test")
@@ -73,7 +104,7 @@ class TestActivityLog:
         result = temp_log.complete_activity(activity_id)
         assert result is True
         assert temp_log.activities[0]["completed"] is True
-        assert "completed_at" in temp_log.activities[0]
+        assert temp_log.activities[0]["completed_at_ns"] >= temp_log.activities[0]["timestamp_ns"]
 
     def test_complete_nonexistent_activity(self, temp_log):
         """Test completing an activity that doesn't exist."""
@@ -89,6 +120,18 @@ class TestActivityLog:
         assert result is True
         assert len(temp_log.activities) == 0
 
+    def test_ids_not_reused_after_delete(self, temp_log):
+        """Test that deleting an activity does not free its id."""
+        temp_log.add_activity("Task 1", "work")
+        temp_log.add_activity("Task 2", "work")
+        temp_log.delete_activity(1)
+
+        activity = temp_log.add_activity("Task 3", "work")
+        assert activity["id"] == 3
+        assert temp_log.complete_activity(2) is True
+        assert temp_log.activities[0]["completed"] is True
+        assert temp_log.activities[1]["completed"] is False
+
     def test_delete_nonexistent_activity(self, temp_log):
         """Test deleting an activity that doesn't exist."""
         temp_log.add_activity("Task 1", "test")
@@ -120,6 +163,44 @@ class TestActivityLog:
         assert stats["categories"]["work"] == 2
         assert stats["categories"]["personal"] == 1
 
+    def test_get_statistics_after_delete(self, temp_log):
+        """Test that deleted activities drop out of the statistics."""
+        temp_log.add_activity("Task 1", "work")
+        temp_log.add_activity("Task 2", "personal")
+        temp_log.complete_activity(1)
+        temp_log.complete_activity(1)
+        temp_log.complete_activity(2)
+        temp_log.delete_activity(2)
+
+        stats = temp_log.get_statistics()
+        assert stats["total"] == 1
+        assert stats["completed"] == 1
+        assert stats["pending"] == 0
+        assert stats["categories"] == {"work": 1}
+        assert temp_log.list_activities(category="personal") == ()
+
+    def test_get_statistics_matches_full_scan(self, temp_log):
+        """Test that the incremental statistics agree with a full recount."""
+        for i in range(200):
+            temp_log.add_activity(f"Task {i}", ("work", "personal", "errands")[i % 3])
+        for activity_id in range(1, 201, 4):
+            temp_log.complete_activity(activity_id)
+        for activity_id in range(1, 201, 6):
+            temp_log.delete_activity(activity_id)
+
+        temp_log.flush()
+        reloaded = ActivityLog(filename=temp_log.filename)
+        for log in (temp_log, reloaded):
+            activities = log.activities
+            categories = dict(Counter(map(itemgetter("category"), activities)))
+            completed = sum(map(itemgetter("completed"), activities))
+
+            stats = log.get_statistics()
+            assert stats["total"] == len(activities)
+            assert stats["completed"] == completed
+            assert stats["pending"] == len(activities) - completed
+            assert stats["categories"] == categories
+
     def test_persistence(self, tmp_path):
         """Test that activities persist across instances."""
         test_file = tmp_path / "persist_test.json"
@@ -127,6 +208,7 @@ class TestActivityLog:
         # Create first instance and add activity
         log1 = ActivityLog(filename=str(test_file))
         log1.add_activity("Persistent task", "test")
+        log1.flush()
         
         # Create second instance and verify data loaded
         log2 = ActivityLog(filename=str(test_file))
@@ -134,8 +216,275 @@ class TestActivityLog:
         assert log2.activities[0]["description"] == "Persistent task"
         
         # Cleanup
+        log1.close()
         test_file.unlink()
 
+    def test_persistence_replays_mutations(self, tmp_path):
+        """Test that completions and deletions are replayed on load."""
+        test_file = tmp_path / "replay_test.jsonl"
+
+        log1 = ActivityLog(filename=str(test_file))
+        log1.add_activity("Task 1", "work")
+        log1.add_activity("Task 2", "work")
+        log1.complete_activity(1)
+        log1.delete_activity(2)
+        log1.close()
+
+        log2 = ActivityLog(filename=str(test_file))
+        assert len(log2.activities) == 1
+        assert log2.activities[0]["id"] == 1
+        assert log2.activities[0]["completed"] is True
+        assert log2.activities[0]["completed_at_ns"] == log1.activities[0]["completed_at_ns"]
+
+    def test_background_flush(self, temp_log):
+        """Test that pending records are written without an explicit flush."""
+        temp_log.add_activity("Task 1", "work")
+        temp_log.add_activity("Task 2", "work")
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if os.path.exists(temp_log.filename) and len(ActivityLog(filename=temp_log.filename).activities) == 2:
+                break
+            time.sleep(0.01)
+
+        reloaded = ActivityLog(filename=temp_log.filename)
+        assert len(reloaded.activities) == 2
+
+    def test_closed_log_is_not_kept_alive(self, tmp_path):
+        """Test that the exit hook does not keep closed logs alive."""
+        log = ActivityLog(filename=str(tmp_path / "gc_test.jsonl"))
+        log.add_activity("Task 1", "work")
+        log.close()
+        ref = weakref.ref(log)
+
+        del log
+        gc.collect()
+        assert ref() is None
+
+    def test_mutations_during_background_flushes(self, tmp_path):
+        """Test that a burst of mutations spanning several flushes persists exactly."""
+        test_file = tmp_path / "stress.json"
+        legacy = [{"id": i, "description": f"Old {i}", "category": "work"} for i in range(1, 5001)]
+        test_file.write_text(json.dumps(legacy))
+
+        log = ActivityLog(filename=str(test_file))
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            activity = log.add_activity("New task", "personal")
+            if activity["id"] % 3 == 0:
+                log.complete_activity(activity["id"] - 1)
+            if activity["id"] % 5 == 0:
+                log.delete_activity(activity["id"] - 4000)
+        log.close()
+
+        reloaded = ActivityLog(filename=str(test_file))
+        assert reloaded.activities == log.activities
+        assert reloaded.get_statistics() == log.get_statistics()
+
+    def test_compact(self, temp_log):
+        """Test that compaction keeps only surviving activities."""
+        temp_log.add_activity("Task 1", "work")
+        temp_log.add_activity("Task 2", "work")
+        temp_log.complete_activity(1)
+        temp_log.delete_activity(2)
+
+        temp_log.compact()
+
+        with open(temp_log.filename, "rb") as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 1
+        reloaded = ActivityLog(filename=temp_log.filename)
+        assert reloaded.activities == temp_log.activities
+
+    def test_dump_pretty(self, temp_log, tmp_path):
+        """Test writing a human-readable dump of the activities."""
+        temp_log.add_activity("Task 1", "work")
+        temp_log.complete_activity(1)
+        dump_file = tmp_path / "dump.json"
+
+        temp_log.dump_pretty(str(dump_file))
+
+        text = dump_file.read_text(encoding="utf-8")
+        assert text.startswith("[\n  {")
+        assert json.loads(text) == temp_log.activities
+
+    def test_load_legacy_snapshot(self, tmp_path):
+        """Test loading a legacy JSON array with missing optional keys."""
+        test_file = tmp_path / "legacy.json"
+        legacy = [{"id": 1, "description": "Old task", "timestamp": "2024-01-02T03:04:05.678901"}]
+        test_file.write_text(json.dumps(legacy))
+
+        log = ActivityLog(filename=str(test_file))
+        assert log.activities[0]["category"] == "general"
+        assert log.activities[0]["completed"] is False
+        assert "timestamp" not in log.activities[0]
+        assert ActivityLog._fmt(log.activities[0]["timestamp_ns"]) == "2024-01-02T03:04:05.678901"
+        assert log.get_statistics()["categories"] == {"general": 1}
+        assert log.add_activity("New task")["id"] == 2
+
+    def test_load_legacy_invalid_timestamp(self, tmp_path):
+        """Test that an unparseable legacy timestamp does not fail the load."""
+        test_file = tmp_path / "legacy.json"
+        legacy = [
+            {"id": 1, "description": "Task 1", "timestamp": "yesterday"},
+            {"id": 2, "description": "Task 2", "timestamp": 5, "completed": True, "completed_at": None},
+        ]
+        test_file.write_text(json.dumps(legacy))
+
+        log = ActivityLog(filename=str(test_file))
+        assert len(log.activities) == 2
+        assert log.activities[0]["timestamp"] == "yesterday"
+        assert "timestamp_ns" not in log.activities[0]
+        assert log.get_statistics()["completed"] == 1
+
+    def test_load_duplicate_ids(self, tmp_path):
+        """Test that activities sharing an id in an old snapshot are all kept."""
+        test_file = tmp_path / "duplicates.json"
+        legacy = [
+            {"id": 1, "description": "Task 1", "category": "work", "completed": True},
+            {"id": 1, "description": "Task 2", "category": "work", "completed": True},
+        ]
+        test_file.write_text(json.dumps(legacy))
+
+        log = ActivityLog(filename=str(test_file))
+        assert [a["id"] for a in log.activities] == [1, 2]
+        assert log.get_statistics() == {"total": 2, "completed": 2, "pending": 0, "categories": {"work": 2}}
+
+        log.delete_activity(2)
+        log.close()
+        reloaded = ActivityLog(filename=str(test_file))
+        assert [a["description"] for a in reloaded.activities] == ["Task 1"]
+
+    def test_mutate_legacy_snapshot(self, tmp_path):
+        """Test that mutating a legacy snapshot converts it to a readable log."""
+        test_file = tmp_path / "legacy.json"
+        test_file.write_text(json.dumps([{"id": 1, "description": "Old task", "category": "work"}]))
+
+        log = ActivityLog(filename=str(test_file))
+        log.add_activity("New task", "work")
+        log.complete_activity(1)
+        log.close()
+
+        reloaded = ActivityLog(filename=str(test_file))
+        assert reloaded.activities == log.activities
+        assert len(reloaded.activities) == 2
+
+    def test_default_file_migrates_legacy_default(self, tmp_path, monkeypatch):
+        """Test that the default log picks up an existing activities.json."""
+        monkeypatch.chdir(tmp_path)
+        legacy = json.dumps([{"id": 1, "description": "Old task", "category": "work"}])
+        (tmp_path / "activities.json").write_text(legacy)
+
+        log = ActivityLog()
+        assert [a["description"] for a in log.activities] == ["Old task"]
+        log.add_activity("New task", "work")
+        log.close()
+
+        assert (tmp_path / "activities.json").read_text() == legacy
+        reloaded = ActivityLog()
+        assert [a["description"] for a in reloaded.activities] == ["Old task", "New task"]
+        reloaded.close()
+
+    def test_mutate_pretty_dump(self, temp_log, tmp_path):
+        """Test that a dump_pretty file can be loaded, mutated and reloaded."""
+        temp_log.add_activity("Task 1", "work")
+        dump_file = tmp_path / "dump.json"
+        temp_log.dump_pretty(str(dump_file))
+
+        log = ActivityLog(filename=str(dump_file))
+        log.delete_activity(1)
+        log.add_activity("Task 2", "work")
+        log.close()
+
+        reloaded = ActivityLog(filename=str(dump_file))
+        assert [a["description"] for a in reloaded.activities] == ["Task 2"]
+
+    def test_load_torn_last_record(self, tmp_path):
+        """Test that a partial last record is skipped and later appends stay readable."""
+        test_file = tmp_path / "torn.jsonl"
+        log = ActivityLog(filename=str(test_file))
+        log.add_activity("Task 1", "work")
+        log.add_activity("Task 2", "work")
+        log.close()
+        with open(test_file, "ab") as f:
+            f.write(b'{"op":"complete","id":1,"compl')
+
+        reloaded = ActivityLog(filename=str(test_file))
+        assert len(reloaded.activities) == 2
+        assert reloaded.get_statistics()["completed"] == 0
+
+        reloaded.add_activity("Task 3", "work")
+        reloaded.close()
+        assert len(ActivityLog(filename=str(test_file)).activities) == 3
+
+    def test_load_malformed_record(self, tmp_path):
+        """Test that a well-formed JSON line that is not a log record is not fatal."""
+        test_file = tmp_path / "malformed.jsonl"
+        test_file.write_bytes(b'{"op":"add","id":1,"description":"Task 1"}\n{"id":2}\n')
+
+        log = ActivityLog(filename=str(test_file))
+        assert [a["id"] for a in log.activities] == [1]
+
+    def test_load_non_integer_id(self, tmp_path):
+        """Test that a record with a non-integer id is rejected before it is indexed."""
+        test_file = tmp_path / "string_id.jsonl"
+        test_file.write_bytes(
+            b'{"op":"add","id":1,"description":"Task 1"}\n'
+            b'{"op":"add","id":"2","description":"Task 2","completed":true}\n'
+        )
+
+        log = ActivityLog(filename=str(test_file))
+        assert [a["id"] for a in log.activities] == [1]
+        assert log.get_statistics() == {"total": 1, "completed": 0, "pending": 1, "categories": {"general": 1}}
+
+    def test_corrupt_log_is_set_aside(self, tmp_path):
+        """Test that writing after a failed load keeps the unreadable bytes."""
+        test_file = tmp_path / "corrupt.jsonl"
+        log = ActivityLog(filename=str(test_file))
+        log.bulk_add([(f"Task {i}", "work") for i in range(1000)])
+        log.close()
+        lines = test_file.read_bytes().splitlines(keepends=True)
+        lines[500] = b'{"op":"edit","id":3}\n'
+        original = b"".join(lines)
+        test_file.write_bytes(original)
+
+        corrupt = ActivityLog(filename=str(test_file))
+        assert corrupt.activities == []
+        corrupt.compact()
+        corrupt.add_activity("Fresh task", "work")
+        corrupt.close()
+
+        assert (tmp_path / "corrupt.jsonl.corrupt").read_bytes() == original
+        reloaded = ActivityLog(filename=str(test_file))
+        assert [a["description"] for a in reloaded.activities] == ["Fresh task"]
+
+    def test_load_large_file(self, tmp_path):
+        """Test replaying a log large enough to be memory-mapped."""
+        test_file = tmp_path / "large.jsonl"
+        log = ActivityLog(filename=str(test_file))
+        log.bulk_add([(f"Task {i}", "work") for i in range(1500)])
+        log.complete_activity(10)
+        log.delete_activity(20)
+        log.close()
+        assert test_file.stat().st_size >= 64 * 1024
+
+        reloaded = ActivityLog(filename=str(test_file))
+        assert reloaded.activities == log.activities
+        assert reloaded.get_statistics()["completed"] == 1
+
+    def test_load_large_corrupted_file(self, tmp_path):
+        """Test that a corrupt memory-mapped log warns instead of raising."""
+        test_file = tmp_path / "large_corrupted.jsonl"
+        log = ActivityLog(filename=str(test_file))
+        log.bulk_add([(f"Task {i}", "work") for i in range(1500)])
+        log.close()
+        lines = test_file.read_bytes().splitlines(keepends=True)
+        lines[700] = b"not valid json{\n"
+        test_file.write_bytes(b"".join(lines))
+
+        reloaded = ActivityLog(filename=str(test_file))
+        assert reloaded.activities == []
+
     def test_load_corrupted_file(self, tmp_path):
         """Test handling of corrupted JSON file."""
         test_file = tmp_path / "corrupted.json"